@@ -5,7 +5,7 @@ Simple Chat CLI for OpenAI‑compatible endpoints.
 Commands
 --------
  \\M                – paste a multi‑line prompt, finish with <<< on its own line
- \\P <file>         – load entire file and send as prompt
+ \\P <file>         – load file (up to 4 MiB) and send as prompt
  \\R [file]         – reset context, optionally saving current context to <file>
  \\L <file>         – load previous output log file as context (after printing this one)
  \\$                – show elapsed time and token count
@@ -16,7 +16,7 @@ Commands
 Requirements
 ------------
  * Python 3.7+ (no `match‑case` so it works on 3.8/3.9 too)
- * pip install openai rich pylatexenc regex
+ * pip install openai rich pylatexenc pyyaml
 """
 
 # ------------------------------------------------------------------------------
@@ -27,52 +27,107 @@ DEFAULT_API_KEY = "CELS"
 DEFAULT_API_BASE = "http://66.55.67.65:80/v1"
 DEFAULT_MODEL = "scout"
 YAML_CONFIG_FILE = "model_servers.yaml"
+DEFAULT_HISTORY_TURNS = 50
+MAX_PROMPT_BYTES = 4 * 1024 * 1024  # \P reads at most this much of a file
 
 # ------------------------------------------------------------------------------
 # Imports
 # ------------------------------------------------------------------------------
+import io
 import os
 import sys
 import time
-import re
-import regex
 import yaml
 import argparse
+import functools
+from collections import OrderedDict
 from datetime import datetime
 from typing import Optional, List, Dict, Any, Tuple
 
-import openai
 from rich.console   import Console
 from rich.markdown  import Markdown
 from rich.syntax    import Syntax
 from rich.table     import Table
-from rich.panel     import Panel
-from pylatexenc.latex2text import LatexNodes2Text
+from rich.live      import Live
+# openai and pylatexenc are imported where they are first used so
+# --list-models / --help and plain-markdown sessions do not pay for them.
+
+# Prefer the libyaml-backed loader when PyYAML was built with it.
+try:
+    from yaml import CSafeLoader as _SafeLoader
+except ImportError:
+    from yaml import SafeLoader as _SafeLoader
 
 # ------------------------------------------------------------------------------
 # 1. Parsing / Display Utilities
 # ------------------------------------------------------------------------------
-_CODE_LATEX_PATTERN = re.compile(
-    r'(?:```[\s\S]*?```)|(?:\$\$.*?\$\$)|(?:\$.*?\$)'
-)
-
 
 def parse_input(input_string: str):
-    """Tokenise assistant output into markdown / code / latex chunks."""
+    """Tokenise assistant output into markdown / code / latex chunks.
+
+    Single pass over the string: ``str.find`` locates the next ``` fence and
+    the next ``$`` and the earliest one is expanded into a token.  Inline
+    ``$...$`` and ``$$...$$`` spans do not cross newlines; a fence or dollar
+    without a closing delimiter is left as markdown.  Code tokens keep their
+    fences; latex tokens carry only the text between the dollar delimiters
+    and a ``display`` flag that is True for ``$$...$$``.
+    """
+    find = input_string.find
+    next_fence = find("```")
+    next_dollar = find("$")
+    if next_fence == -1 and next_dollar == -1:
+        # Plain markdown reply: no fences or math to scan for
+        return [{"type": "markdown", "content": input_string}] if input_string else []
+
     tokens = []
-    last_end = 0
-    for match in _CODE_LATEX_PATTERN.finditer(input_string):
-        start, end = match.span()
-        if start > last_end:
-            tokens.append({"type": "markdown", "content": input_string[last_end:start]})
-        content = match.group()
-        if content.startswith("```"):
-            tokens.append({"type": "code", "content": content})
+    md_start = pos = 0
+    while True:
+        if -1 < next_fence < pos:
+            next_fence = find("```", pos)
+        if -1 < next_dollar < pos:
+            next_dollar = find("$", pos)
+        if next_fence == -1 and next_dollar == -1:
+            break
+
+        if next_dollar == -1 or -1 < next_fence < next_dollar:
+            start = next_fence
+            close = find("```", start + 3)
+            if close == -1:
+                # No closing fence anywhere after this one, so none can match.
+                next_fence = -1
+                continue
+            end = close + 3
+            kind = "code"
+            content = input_string[start:end]
+        else:
+            start = next_dollar
+            end = -1
+            if input_string.startswith("$$", start):
+                close = find("$$", start + 2)
+                if close != -1 and find("\n", start + 2, close) == -1:
+                    end = close + 2
+                    content = input_string[start + 2:close]
+                    display = True
+            if end == -1:
+                close = find("$", start + 1)
+                if close != -1 and find("\n", start + 1, close) == -1:
+                    end = close + 1
+                    content = input_string[start + 1:close]
+                    display = False
+            if end == -1:
+                pos = start + 1
+                continue
+            kind = "latex"
+
+        if start > md_start:
+            tokens.append({"type": "markdown", "content": input_string[md_start:start]})
+        if kind == "latex":
+            tokens.append({"type": kind, "content": content, "display": display})
         else:
-            tokens.append({"type": "latex", "content": content})
-        last_end = end
-    if last_end < len(input_string):
-        tokens.append({"type": "markdown", "content": input_string[last_end:]})
+            tokens.append({"type": kind, "content": content})
+        md_start = pos = end
+    if md_start < len(input_string):
+        tokens.append({"type": "markdown", "content": input_string[md_start:]})
     return tokens
 
 
@@ -80,71 +135,242 @@ def process_markdown(content: str, console: Console):
     console.print(Markdown(content))
 
 
+@functools.lru_cache(maxsize=None)
+def _latex_converter():
+    """Build the LatexNodes2Text converter (and its macro tables) once."""
+    from pylatexenc.latex2text import LatexNodes2Text
+    return LatexNodes2Text()
+
+
 def process_latex(content: str, console: Console):
-    if content.startswith("$$"):
-        content = content[2:-2]
-    elif content.startswith('$'):
-        content = content[1:-1]
-    console.print(LatexNodes2Text().latex_to_text(content))
+    """Render a latex token; *content* is already stripped of its $/$$ delimiters."""
+    console.print(_latex_converter().latex_to_text(content))
 
 
 def process_code(content: str, console: Console):
-    m = re.match(r'```(\w+)?\n', content)
-    if m:
-        language = m.group(1) or ""
-        code = content[m.end():]
-        code = code.rstrip('`').rstrip()
+    nl = content.find('\n')
+    if nl != -1 and content.startswith('```'):
+        # ```lang\n ... ``` : info string up to the first newline, body up to the closing fence
+        language = content[3:nl].strip()
+        end = content.rfind('```')
+        if end <= nl:
+            end = len(content)
+        code = content[nl + 1:end].rstrip()
     else:
         language = ""
         code = content.strip('`')
     console.print(Syntax(code, lexer=language, line_numbers=False))
 
+
+# Backslash-escape markdown punctuation in converted inline math
+_MD_ESCAPE = str.maketrans({c: "\\" + c for c in "\\`*_{}[]<>()#+-.!|~"})
+
+
+def render_reply(text: str, console: Console):
+    """
+    Render a complete assistant reply token by token.  Inline $...$ math is
+    converted to text and folded into the surrounding markdown, so each run of
+    prose between code blocks and display math goes through Markdown once.
+    """
+    md_parts = []
+
+    def flush_markdown():
+        if md_parts:
+            process_markdown("".join(md_parts), console)
+            md_parts.clear()
+
+    for t in parse_input(text):
+        if t["type"] == "markdown":
+            md_parts.append(t["content"])
+        elif t["type"] == "latex" and not t["display"]:
+            md_parts.append(_latex_converter().latex_to_text(t["content"]).translate(_MD_ESCAPE))
+        else:
+            flush_markdown()
+            if t["type"] == "latex":
+                process_latex(t["content"], console)
+            elif t["type"] == "code":
+                process_code(t["content"], console)
+    flush_markdown()
+
+
+STREAM_REFRESH_HZ = 8
+
+
+def stream_reply(client, model_name: str, messages: List[Dict[str, str]], console: Console) -> Tuple[str, int]:
+    """
+    Stream a chat completion, showing a live markdown preview as it arrives.
+    Returns (assistant_text, total_tokens); tokens are 0 if the server sends no usage.
+    """
+    stream = client.chat.completions.create(
+        model=model_name,
+        messages=messages,
+        stream=True,
+        stream_options={"include_usage": True},
+    )
+    parts = []
+    tokens = 0
+    last_draw = 0.0
+    # transient: the preview is cleared so the final token-aware render replaces it
+    with Live(console=console, refresh_per_second=STREAM_REFRESH_HZ, transient=True) as live:
+        for chunk in stream:
+            usage = getattr(chunk, 'usage', None)
+            if usage is not None:
+                tokens = usage.total_tokens or 0
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                parts.append(delta)
+                now = time.monotonic()
+                if now - last_draw >= 1 / STREAM_REFRESH_HZ:
+                    live.update(Markdown("".join(parts)))
+                    last_draw = now
+    return "".join(parts), tokens
+
+
+def history_window(messages: List[Dict[str, str]], max_turns: int) -> List[Dict[str, str]]:
+    """
+    Return the slice of *messages* sent to the API: the last *max_turns*
+    user/assistant pairs, keeping a leading system message if there is one.
+    max_turns <= 0 sends the whole history.
+    """
+    limit = 2 * max_turns
+    if max_turns <= 0 or len(messages) <= limit:
+        return messages
+    if messages[0].get("role") == "system":
+        return [messages[0]] + messages[1:][-limit:]
+    return messages[-limit:]
+
 # ------------------------------------------------------------------------------
 # 2. Logging Utilities
 # ------------------------------------------------------------------------------
 
 def rename_logs(prompts_log: str, outputs_log: str):
     ts = datetime.now().strftime("%Y%m%d_%H%M%S")
-    try:
-        if os.path.exists(prompts_log):
-            os.rename(prompts_log, f"prompts_{ts}.log")
-        if os.path.exists(outputs_log):
-            os.rename(outputs_log, f"outputs_{ts}.log")
-    except OSError as e:
-        print(f"Warning: Could not rename log files: {e}")
+    for src, dst in ((prompts_log, f"prompts_{ts}.log"), (outputs_log, f"outputs_{ts}.log")):
+        try:
+            os.replace(src, dst)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f"Warning: Could not rename log file {src}: {e}")
+
 
+LOG_BUFFER_SIZE = 64 * 1024
 
-def append_line(path: str, text: str):
+
+def open_log(path: str):
+    """Truncate *path* and return a buffered handle kept open for the session."""
+    return open(path, 'w', buffering=LOG_BUFFER_SIZE, encoding='utf-8', errors='replace')
+
+
+def append_line(f, text: str):
+    """Write one log entry and flush it so a crash does not lose the turn."""
     try:
-        with open(path, 'a', encoding='utf-8', errors='replace') as f:
-            f.write(text + "\n")
-    except IOError as e:
-        print(f"Warning: Could not write to {path}: {e}")
+        f.write(text)
+        f.write("\n")
+        f.flush()
+    except (IOError, ValueError) as e:
+        print(f"Warning: Could not write to {f.name}: {e}")
 
 # ------------------------------------------------------------------------------
 # 3. Configuration Loading Functions
 # ------------------------------------------------------------------------------
 
-def load_server_configs(config_file: str = None) -> List[Dict[str, Any]]:
-    """Load server configurations from YAML file."""
+# (api_key, api_base, model, missing_env_var): api_key is None and
+# missing_env_var names the variable when a ${VAR} key could not be resolved.
+ResolvedServer = Tuple[Optional[str], str, str, Optional[str]]
+
+# Parsed server lists keyed by path; entries are (mtime, size, servers, index)
+# and are re-parsed whenever the file changes on disk.  Callers treat the lists
+# as read-only, so they are returned without copying.
+_YAML_CACHE_MAX = 100
+_YAML_CACHE: "OrderedDict[str, Tuple[float, int, List[Dict[str, Any]], Dict[str, ResolvedServer]]]" = OrderedDict()
+
+
+def _resolve_server(server: Dict[str, Any]) -> ResolvedServer:
+    """Resolve a server's connection settings, expanding a ${VAR} API key once."""
+    api_key = server.get('openai_api_key', DEFAULT_API_KEY)
+    missing_env = None
+    
+    # A bare "openai_api_key:" parses as None and an unquoted number as int;
+    # normalise so one odd entry can't break indexing the whole file
+    if api_key is None:
+        api_key = DEFAULT_API_KEY
+    elif not isinstance(api_key, str):
+        api_key = str(api_key)
+    
+    # Handle environment variable in API key
+    if api_key.startswith("${") and api_key.endswith("}"):
+        env_var = api_key[2:-1]
+        api_key = os.environ.get(env_var)
+        if not api_key:
+            api_key, missing_env = None, env_var
+    
+    return (
+        api_key,
+        server.get('openai_api_base', DEFAULT_API_BASE),
+        server.get('openai_model', DEFAULT_MODEL),
+        missing_env
+    )
+
+
+def _build_server_index(servers: List[Dict[str, Any]]) -> Dict[str, ResolvedServer]:
+    """Map lower-cased model, server and shortname to the first server that has it."""
+    index = {}
+    for server in servers:
+        resolved = None
+        for field in ('openai_model', 'server', 'shortname'):
+            value = server.get(field)
+            if isinstance(value, str) and value.lower() not in index:
+                if resolved is None:
+                    resolved = _resolve_server(server)
+                index[value.lower()] = resolved
+    return index
+
+
+def _load_server_entry(config_file: str = None) -> Tuple[List[Dict[str, Any]], Dict[str, ResolvedServer]]:
+    """Return (servers, index) for a config file, using the cache when fresh."""
     if config_file is None:
         config_file = YAML_CONFIG_FILE
         
-    if not os.path.exists(config_file):
+    try:
+        # The stat doubles as the existence check and the cache validator
+        st = os.stat(config_file)
+    except FileNotFoundError:
         print(f"Warning: Configuration file {config_file} not found.")
-        return []
+        return [], {}
+    except OSError as e:
+        print(f"Error loading configuration file {config_file}: {e}")
+        return [], {}
         
     try:
+        cached = _YAML_CACHE.get(config_file)
+        if cached and cached[0] == st.st_mtime and cached[1] == st.st_size:
+            _YAML_CACHE.move_to_end(config_file)
+            return cached[2], cached[3]
+
         with open(config_file, 'r', encoding='utf-8') as f:
-            config = yaml.safe_load(f)
+            config = yaml.load(f, Loader=_SafeLoader)
             if config and 'servers' in config and isinstance(config['servers'], list):
-                return config['servers']
+                servers = config['servers']
+                index = _build_server_index(servers)
+                _YAML_CACHE[config_file] = (st.st_mtime, st.st_size, servers, index)
+                _YAML_CACHE.move_to_end(config_file)
+                if len(_YAML_CACHE) > _YAML_CACHE_MAX:
+                    _YAML_CACHE.popitem(last=False)
+                return servers, index
             else:
                 print(f"Warning: No valid server configurations found in {config_file}")
-                return []
+                return [], {}
     except Exception as e:
         print(f"Error loading configuration file {config_file}: {e}")
-        return []
+        return [], {}
+
+
+def load_server_configs(config_file: str = None) -> List[Dict[str, Any]]:
+    """Load server configurations from YAML file (cached by mtime and size)."""
+    return _load_server_entry(config_file)[0]
 
 
 def select_server_config(model_name: Optional[str] = None, config_file: str = None) -> Tuple[str, str, str]:
@@ -152,32 +378,19 @@ def select_server_config(model_name: Optional[str] = None, config_file: str = No
     Select a server configuration based on model name.
     Returns (api_key, api_base, model_name)
     """
-    servers = load_server_configs(config_file)
+    servers, index = _load_server_entry(config_file)
     
     # If no model specified or no configurations found, use defaults
     if not model_name or not servers:
         return DEFAULT_API_KEY, DEFAULT_API_BASE, DEFAULT_MODEL
     
-    # Find server with matching model name or shortname
-    for server in servers:
-        if (server.get('openai_model', '').lower() == model_name.lower() or 
-            server.get('server', '').lower() == model_name.lower() or
-            server.get('shortname', '').lower() == model_name.lower()):
-            
-            api_key = server.get('openai_api_key', DEFAULT_API_KEY)
-            
-            # Handle environment variable in API key
-            if api_key.startswith("${") and api_key.endswith("}"):
-                env_var = api_key[2:-1]
-                api_key = os.environ.get(env_var)
-                if not api_key:
-                    raise ValueError(f"Environment variable {env_var} not set. Required for {server.get('openai_model')}")
-            
-            return (
-                api_key,
-                server.get('openai_api_base', DEFAULT_API_BASE),
-                server.get('openai_model', DEFAULT_MODEL)
-            )
+    # Find server with matching model name, server or shortname
+    resolved = index.get(model_name.lower())
+    if resolved is not None:
+        api_key, api_base, model, missing_env = resolved
+        if missing_env:
+            raise ValueError(f"Environment variable {missing_env} not set. Required for {model}")
+        return api_key, api_base, model
     # If model not found, return error message and use defaults
     print(f"Warning: Model '{model_name}' not found in configuration. Using default model.")
     return DEFAULT_API_KEY, DEFAULT_API_BASE, DEFAULT_MODEL
@@ -217,6 +430,7 @@ def main():
     parser.add_argument("--model", "-m", type=str, help="Model name or shortname to use from configuration")
     parser.add_argument("--list-models", "-l", action="store_true", help="List available models with their shortnames")
     parser.add_argument("--config", "-c", type=str, default="model_servers.yaml", help="Path to model servers configuration file (default: model_servers.yaml)")
+    parser.add_argument("--history-turns", type=int, default=DEFAULT_HISTORY_TURNS, help=f"Number of recent user/assistant turns sent with each prompt, 0 for all (default: {DEFAULT_HISTORY_TURNS})")
     args = parser.parse_args()
     
     console = Console()
@@ -229,8 +443,8 @@ def main():
         return
 
     try:
-        open(prompts_log, 'w', encoding='utf-8').close()
-        open(outputs_log, 'w', encoding='utf-8').close()
+        prompts_fh = open_log(prompts_log)
+        outputs_fh = open_log(outputs_log)
     except IOError as e:
         console.print(f"[red]Error creating log files: {e}[/red]")
         sys.exit(1)
@@ -242,6 +456,7 @@ def main():
         console.print(f"[red]Error: {e}[/red]")
         sys.exit(1)
     
+    import openai
     client = openai.OpenAI(api_key=api_key, base_url=api_base)
 
     messages = []
@@ -269,7 +484,7 @@ def main():
     def show_help():
         console.print("[bold yellow]Available Commands:[/bold yellow]")
         console.print(r"[cyan]\M[/cyan]                – paste a multi‑line prompt, finish with <<< on its own line")
-        console.print(r"[cyan]\P <file>[/cyan]         – load entire file and send as prompt")
+        console.print(rf"[cyan]\P <file>[/cyan]         – load file (up to {MAX_PROMPT_BYTES // (1024 * 1024)} MiB, larger files are truncated) and send as prompt")
         console.print(r"[cyan]\R[/cyan] [file]         – reset context, optionally saving current context to <file>")
         console.print(r"[cyan]\L <file>[/cyan]         – load previous output log file as context")
         console.print(r"[cyan]\$[/cyan]                – show elapsed time and token count")
@@ -279,7 +494,7 @@ def main():
         console.print()  # Add spacing after help display
     
     def reset_context(save_file: Optional[str] = None):
-        nonlocal messages, start_time, total_tokens
+        nonlocal messages, start_time, total_tokens, prompts_fh, outputs_fh
         if save_file:
             try:
                 with open(save_file, 'w', encoding='utf-8', errors='replace') as f:
@@ -289,10 +504,11 @@ def main():
             except IOError as e:
                 console.print(f"[red]Error saving context to {save_file}: {e}[/red]")
         
+        close_logs()
         rename_logs(prompts_log, outputs_log)
         try:
-            open(prompts_log, 'w', encoding='utf-8').close()
-            open(outputs_log, 'w', encoding='utf-8').close()
+            prompts_fh = open_log(prompts_log)
+            outputs_fh = open_log(outputs_log)
         except IOError as e:
             console.print(f"[red]Error resetting log files: {e}[/red]")
         
@@ -301,12 +517,110 @@ def main():
         total_tokens = 0
         console.print("[bold green]Context reset.[/bold green]")
 
+    def close_logs():
+        prompts_fh.close()
+        outputs_fh.close()
+
     def graceful_shutdown():
         show_stats()
+        close_logs()
         rename_logs(prompts_log, outputs_log)
         console.print("[bold red]Shutting down…[/bold red]")
         sys.exit(0)
 
+    # ------------------- Command handlers -------------------
+    # Each handler receives the raw input line and returns the prompt to send,
+    # or None when the command was handled locally.
+
+    def handle_stats(user_input: str) -> Optional[str]:
+        show_stats()
+        return None
+
+    def handle_help(user_input: str) -> Optional[str]:
+        show_help()
+        return None
+
+    def handle_shutdown(user_input: str) -> Optional[str]:
+        graceful_shutdown()
+        return None
+
+    def handle_reset(user_input: str) -> Optional[str]:
+        parts = user_input.split(maxsplit=1)
+        reset_context(parts[1] if len(parts) > 1 else None)
+        return None
+
+    def handle_load(user_input: str) -> Optional[str]:
+        if not user_input.startswith("\\L "):
+            return user_input
+        file_to_load = user_input[3:].strip()
+        if not file_to_load:
+            console.print("[red]Error: Missing filename after \\L command[/red]")
+            return None
+            
+        try:
+            with open(file_to_load, 'r', encoding='utf-8', errors='replace') as f:
+                content = f.read()
+                messages.append({"role": "assistant", "content": content})
+            console.print(f"[green]Loaded context from {file_to_load}[/green]")
+        except FileNotFoundError:
+            console.print(f"[red]File not found: {file_to_load}[/red]")
+        except IOError as e:
+            console.print(f"[red]Error reading file {file_to_load}: {e}[/red]")
+        return None
+
+    def handle_multiline(user_input: str) -> Optional[str]:
+        console.print("[yellow]Entering multi‑line mode. End with a line containing only <<<[/yellow]")
+        buf = io.StringIO()
+        while True:
+            try:
+                line = input()
+            except KeyboardInterrupt:
+                console.print("[red]Cancelled.[/red]")
+                return None
+            if line.strip() == "<<<":
+                break
+            buf.write(line)
+            buf.write("\n")
+        return buf.getvalue().strip() or None  # nothing to send
+
+    def handle_prompt_file(user_input: str) -> Optional[str]:
+        if not user_input.startswith("\\P "):
+            return user_input
+        file_to_read = user_input[3:].strip()
+        if not file_to_read:
+            console.print("[red]Error: Missing filename after \\P command[/red]")
+            return None
+            
+        try:
+            with open(file_to_read, 'rb') as f:
+                data = f.read(MAX_PROMPT_BYTES + 1)
+        except FileNotFoundError:
+            console.print(f"[red]File not found: {file_to_read}[/red]")
+            return None
+        except IOError as e:
+            console.print(f"[red]Error reading file {file_to_read}: {e}[/red]")
+            return None
+        if len(data) > MAX_PROMPT_BYTES:
+            console.print(f"[yellow]Warning: File {file_to_read} is larger than {MAX_PROMPT_BYTES} bytes; truncating[/yellow]")
+            data = data[:MAX_PROMPT_BYTES]
+        prompt = data.decode('utf-8', errors='replace')
+        if not prompt.strip():
+            console.print(f"[yellow]Warning: File {file_to_read} is empty[/yellow]")
+            return None
+        return prompt
+
+    # Keyed on the first two characters of the input line
+    command_handlers = {
+        "\\$": handle_stats,
+        "\\h": handle_help,
+        "\\?": handle_help,
+        "\\Q": handle_shutdown,
+        "\\R": handle_reset,
+        "\\L": handle_load,
+        "\\M": handle_multiline,
+        "\\P": handle_prompt_file,
+    }
+
     # ------------------- Main REPL -------------------
     while True:
         console.print()  # blank line for spacing
@@ -317,108 +631,35 @@ def main():
         user_input = input().rstrip()
         if user_input.lower() in {"exit", "quit"}:
             console.print("[bold green]Goodbye![/bold green]")
+            close_logs()
             break
 
-        if user_input.startswith("\\$"):
-            show_stats()
-            continue
-            
-        if user_input.startswith("\\h") or user_input.startswith("\\?"):
-            show_help()
-            continue
-
-        if user_input.startswith("\\Q"):
-            graceful_shutdown()
-
-        if user_input.startswith("\\R"):
-            parts = user_input.split(maxsplit=1)
-            reset_context(parts[1] if len(parts) > 1 else None)
-            continue
-
-        if user_input.startswith("\\L "):
-            file_to_load = user_input[3:].strip()
-            if not file_to_load:
-                console.print("[red]Error: Missing filename after \\L command[/red]")
-                continue
-                
-            try:
-                with open(file_to_load, 'r', encoding='utf-8', errors='replace') as f:
-                    content = f.read()
-                    messages.append({"role": "assistant", "content": content})
-                console.print(f"[green]Loaded context from {file_to_load}[/green]")
-            except FileNotFoundError:
-                console.print(f"[red]File not found: {file_to_load}[/red]")
-            except IOError as e:
-                console.print(f"[red]Error reading file {file_to_load}: {e}[/red]")
-            continue
-
-        if user_input.startswith("\\M"):
-            console.print("[yellow]Entering multi‑line mode. End with a line containing only <<<[/yellow]")
-            multi_lines = []
-            while True:
-                try:
-                    line = input()
-                except KeyboardInterrupt:
-                    console.print("[red]Cancelled.[/red]")
-                    multi_lines = []
-                    break
-                if line.strip() == "<<<":
-                    break
-                multi_lines.append(line)
-            user_input = "\n".join(multi_lines).strip()
-            if not user_input:
-                continue  # nothing to send
-
-        elif user_input.startswith("\\P "):
-            file_to_read = user_input[3:].strip()
-            if not file_to_read:
-                console.print("[red]Error: Missing filename after \\P command[/red]")
-                continue
-                
-            try:
-                with open(file_to_read, 'r', encoding='utf-8', errors='replace') as f:
-                    user_input = f.read()
-                    if not user_input.strip():
-                        console.print(f"[yellow]Warning: File {file_to_read} is empty[/yellow]")
-                        continue
-            except FileNotFoundError:
-                console.print(f"[red]File not found: {file_to_read}[/red]")
-                continue
-            except IOError as e:
-                console.print(f"[red]Error reading file {file_to_read}: {e}[/red]")
+        handler = command_handlers.get(user_input[:2])
+        if handler is not None:
+            user_input = handler(user_input)
+            if user_input is None:
                 continue
 
         # ---- Send to LLM ----
-        append_line(prompts_log, user_input)
+        append_line(prompts_fh, user_input)
         messages.append({"role": "user", "content": user_input})
 
         try:
-            response = client.chat.completions.create(model=model_name, messages=messages)
+            assistant_msg, used_tokens = stream_reply(
+                client, model_name, history_window(messages, args.history_turns), console
+            )
         except Exception as e:
             console.print(f"[red]API error: {e}[/red]")
             messages.pop()  # remove last user message
             continue
 
-        assistant_msg = response.choices[0].message.content
-        append_line(outputs_log, assistant_msg)
-
-        try:
-            if response.usage is not None:
-                total_tokens += response.usage.total_tokens or 0
-        except (AttributeError, TypeError):
-            # Handle case where usage information is unavailable
-            pass
+        append_line(outputs_fh, assistant_msg)
+        total_tokens += used_tokens
 
         messages.append({"role": "assistant", "content": assistant_msg})
 
         # ---- Render nicely ----
-        for t in parse_input(assistant_msg):
-            if t["type"] == "markdown":
-                process_markdown(t["content"], console)
-            elif t["type"] == "latex":
-                process_latex(t["content"], console)
-            elif t["type"] == "code":
-                process_code(t["content"], console)
+        render_reply(assistant_msg, console)
 
 # ------------------------------------------------------------------------------
 if __name__ == "__main__":
@@ -1,16 +1,36 @@
 #!/usr/bin/env python3
 import os
+import re
 import sys
 import yaml
-import openai
 import time
 import argparse
 import asyncio
 import io
 import curses
 import textwrap
+import collections
+import functools
+from types import MappingProxyType
 from datetime import datetime
-from openai import OpenAI, APIError, APITimeoutError, APIConnectionError, RateLimitError, AuthenticationError
+from urllib.parse import urlparse
+from openai import AsyncOpenAI, APIError, APITimeoutError, APIConnectionError, RateLimitError, AuthenticationError
+
+# uvloop is optional; the event loop falls back to stock asyncio without it
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
+# Prefer the libyaml-backed loader when PyYAML was built with it
+try:
+    from yaml import CSafeLoader as _SafeLoader
+except ImportError:
+    from yaml import SafeLoader as _SafeLoader
+
+# Whether stdout is a terminal; the console countdown only animates on one
+_INTERACTIVE = sys.stdout.isatty()
+
 # ANSI color codes for terminal output
 GREEN = "\033[92m"
 RED = "\033[91m"
@@ -33,6 +53,11 @@ MODEL_PARAMS = {
     "meta-llama/Llama-3.3-70B-Instruct": {"max_completion_tokens": 50},  # Llama 3.3 70B model
 }
 
+# The single prompt sent to every endpoint
+TEST_MESSAGES = [
+    {"role": "user", "content": "What is 2+2? Please provide a short, direct answer."}
+]
+
 # Server-specific curses colors
 SERVER_COLORS = {
     "scout": 1,    # Orange-like
@@ -55,6 +80,217 @@ CURSES_COLOR_PAIRS = {
     "time": 6
 }
 
+# Async OpenAI clients keyed by (api_base, api_key), reused across test
+# iterations so each endpoint keeps its pooled keep-alive connections
+_CLIENT_CACHE = {}
+
+def _get_client(api_base, api_key):
+    """Return a cached client for the endpoint, resolving the API key first.
+
+    Raises ValueError if no key is available or a ${VAR} key is not set.
+    """
+    # Get API key from parameter or environment
+    if not api_key:
+        api_key = os.environ.get('OPENAI_API_KEY')
+        if not api_key:
+            raise ValueError("OPENAI_API_KEY environment variable not set")
+        
+    # Handle variable substitution in API key
+    if api_key.startswith("${") and api_key.endswith("}"):
+        env_var = api_key[2:-1]  # Remove ${ and }
+        api_key = os.environ.get(env_var)
+        if not api_key:
+            raise ValueError(f"Environment variable {env_var} not set")
+            
+    key = (api_base, api_key)
+    client = _CLIENT_CACHE.get(key)
+    if client is None:
+        # SDK retries off: _create_with_retry is the only retry layer, so every
+        # 429 reaches HostLimiter and every attempt is counted by the RPM gate
+        client = AsyncOpenAI(api_key=api_key, base_url=api_base, max_retries=0)
+        _CLIENT_CACHE[key] = client
+    return client
+
+# Default cap on simultaneous requests to one host (--max-concurrency-per-host)
+DEFAULT_MAX_CONCURRENCY_PER_HOST = 8
+_max_concurrency_per_host = DEFAULT_MAX_CONCURRENCY_PER_HOST
+
+# Rate-limit retries: attempts after the first 429, and the longest wait honoured
+MAX_RATE_LIMIT_RETRIES = 3
+MAX_RETRY_DELAY = 60.0
+# Seconds of request history used to judge a host's recent 429 rate
+RATE_WINDOW_SECONDS = 60.0
+
+_DURATION_RE = re.compile(r'(\d+(?:\.\d+)?)(ms|s|m|h)')
+_DURATION_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+class HostLimiter:
+    """Adaptive concurrency limit for one API host (additive increase, multiplicative decrease)"""
+    def __init__(self, max_limit):
+        self.max_limit = max_limit
+        self.limit = max_limit
+        self.in_flight = 0
+        self.history = collections.deque()  # (monotonic time, was_rate_limited)
+        self._cond = asyncio.Condition()
+        
+    async def __aenter__(self):
+        async with self._cond:
+            await self._cond.wait_for(lambda: self.in_flight < self.limit)
+            self.in_flight += 1
+        return self
+        
+    async def __aexit__(self, exc_type, exc, tb):
+        async with self._cond:
+            self.in_flight -= 1
+            self._cond.notify_all()
+            
+    def record(self, rate_limited):
+        """Feed back one request outcome: halve the limit on a 429, grow it by one when healthy"""
+        now = time.monotonic()
+        self.history.append((now, rate_limited))
+        while self.history[0][0] < now - RATE_WINDOW_SECONDS:
+            self.history.popleft()
+            
+        if rate_limited:
+            self.limit = max(1, self.limit // 2)
+        elif self.limit < self.max_limit:
+            errors = sum(1 for _, limited in self.history if limited)
+            if errors / len(self.history) < 0.05:
+                self.limit += 1
+
+# One limiter per api_base host, created on first use
+_HOST_LIMITERS = {}
+
+def set_max_concurrency_per_host(limit):
+    """Set the per-host request cap; applies to limiters created afterwards"""
+    global _max_concurrency_per_host
+    _max_concurrency_per_host = max(1, limit)
+
+def _host_of(api_base):
+    """Host (netloc) part of an API base URL, used to key per-host limits"""
+    return urlparse(api_base or "").netloc
+
+def _host_limiter(host):
+    """Return the limiter bounding concurrent requests to a host"""
+    limiter = _HOST_LIMITERS.get(host)
+    if limiter is None:
+        limiter = _HOST_LIMITERS[host] = HostLimiter(_max_concurrency_per_host)
+    return limiter
+
+# Requests-per-minute gate: timestamps of requests sent in the last minute per
+# host, and the limit for hosts whose servers set rpm_limit in the YAML
+_RPM_WINDOWS = collections.defaultdict(collections.deque)
+_RPM_LIMITS = {}
+
+def register_rpm_limits(servers):
+    """Record rpm_limit from server entries, keeping the strictest limit per host"""
+    for server in servers:
+        limit = server.get('rpm_limit')
+        if not limit:
+            continue
+        # Skip a bad limit rather than failing the whole config over it
+        try:
+            limit = int(limit)
+        except (TypeError, ValueError):
+            print(f"Warning: Ignoring invalid rpm_limit {limit!r} for {server.get('shortname', 'unknown server')}")
+            continue
+        if limit <= 0:
+            continue
+        host = _host_of(server.get('openai_api_base'))
+        _RPM_LIMITS[host] = min(limit, _RPM_LIMITS.get(host, limit))
+
+async def wait_if_throttled(host):
+    """Wait until sending one more request keeps the host within its per-minute limit.
+
+    Each call records exactly one HTTP request; this holds because cached
+    clients are built with the SDK's own retries disabled.
+    """
+    limit = _RPM_LIMITS.get(host)
+    if not limit:
+        return
+    window = _RPM_WINDOWS[host]
+    while True:
+        now = time.monotonic()
+        while window and window[0] <= now - 60.0:
+            window.popleft()
+        if len(window) < limit:
+            break
+        await asyncio.sleep(window[0] + 60.0 - now)
+    window.append(time.monotonic())
+
+def _parse_duration(value):
+    """Parse a retry hint: plain seconds ("2", "0.5") or OpenAI style ("1s", "6m0s", "20ms")"""
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = _DURATION_RE.findall(value)
+    if not parts:
+        return None
+    return sum(float(n) * _DURATION_UNITS[unit] for n, unit in parts)
+
+def _retry_delay(error, attempt):
+    """Seconds to wait before retrying a RateLimitError, from its headers or exponential backoff"""
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None) or {}
+    ms = headers.get('retry-after-ms')
+    if ms:
+        delay = _parse_duration(ms)
+        if delay is not None:
+            return min(delay / 1000.0, MAX_RETRY_DELAY)
+    for name in ('retry-after', 'x-ratelimit-reset-requests', 'x-ratelimit-reset-tokens'):
+        value = headers.get(name)
+        if value:
+            delay = _parse_duration(value)
+            if delay is not None:
+                return min(delay, MAX_RETRY_DELAY)
+    return min(2.0 ** attempt, MAX_RETRY_DELAY)
+
+async def _create_with_retry(client, params, api_base, on_retry=None):
+    """Send a chat completion through the host's RPM gate and limiter, retrying 429s with the server's hinted delay.
+
+    on_retry(delay, attempt) is called before each wait. The last RateLimitError is re-raised.
+    """
+    host = _host_of(api_base)
+    limiter = _host_limiter(host)
+    for attempt in range(MAX_RATE_LIMIT_RETRIES + 1):
+        await wait_if_throttled(host)
+        try:
+            async with limiter:
+                response = await client.chat.completions.create(**params)
+        except RateLimitError as e:
+            limiter.record(True)
+            if attempt == MAX_RATE_LIMIT_RETRIES:
+                raise
+            delay = _retry_delay(e, attempt)
+            if on_retry:
+                on_retry(delay, attempt + 1)
+            # Wait outside the limiter so other requests can use the slot
+            await asyncio.sleep(delay)
+        else:
+            limiter.record(False)
+            return response
+
+# Messages kept per server window; older ones fall off the deque
+MAX_SERVER_LINES = 20
+
+# Last formatted wall-clock second as (epoch second, "HH:MM:SS")
+_TS_CACHE = (0, "")
+
+def _now_hms():
+    """Return the current local time as HH:MM:SS, formatting at most once per second"""
+    global _TS_CACHE
+    t = int(time.time())
+    if _TS_CACHE[0] != t:
+        _TS_CACHE = (t, time.strftime("%H:%M:%S", time.localtime(t)))
+    return _TS_CACHE[1]
+
+def _fit_message(message, width):
+    """Truncate a message with an ellipsis so it fits in width columns"""
+    if len(message) > width:
+        return message[:width-3] + "..."
+    return message
+
 class CursesUI:
     """Manages the curses-based UI for server testing"""
     def __init__(self, stdscr):
@@ -63,6 +299,9 @@ class CursesUI:
         self.header_win = None
         self.footer_win = None
         self.max_y, self.max_x = stdscr.getmaxyx()
+        self._servers = None
+        # Last rendered rows per server window, used to repaint only what changed
+        self._prev = {}
         self.setup_colors()
         
     def setup_colors(self):
@@ -91,18 +330,24 @@ class CursesUI:
         """Create windows for each server and header/footer"""
         # Clear everything
         self.stdscr.clear()
+        self.stdscr.noutrefresh()
+        self._servers = servers
+        old_windows = self.server_windows
         self.server_windows = {}
+        self._prev = {}
         
         # Get current terminal dimensions
         self.max_y, self.max_x = self.stdscr.getmaxyx()
         
         # Create header window (3 lines at top)
         header_height = 3
-        self.header_win = curses.newwin(header_height, self.max_x, 0, 0)
+        self.header_win = self._place_window(self.header_win, header_height, self.max_x, 0, 0)
         
         # Create footer window (3 lines at bottom)
         footer_height = 3
-        self.footer_win = curses.newwin(footer_height, self.max_x, self.max_y - footer_height, 0)
+        self.footer_win = self._place_window(
+            self.footer_win, footer_height, self.max_x, self.max_y - footer_height, 0
+        )
         
         # Calculate server window layout
         num_servers = len(servers)
@@ -139,8 +384,11 @@ class CursesUI:
             y = header_height + (row * win_height)
             x = col * win_width
             
-            # Create window
-            win = curses.newwin(win_height, win_width, y, x)
+            # Reuse the server's window from the previous layout when there is one
+            old_info = old_windows.get(shortname)
+            win = self._place_window(
+                old_info['window'] if old_info else None, win_height, win_width, y, x
+            )
             win.scrollok(True)
             
             # Setup server window info
@@ -151,14 +399,25 @@ class CursesUI:
                 'server': server.get('server', 'Unknown'),
                 'status': 'Waiting',
                 'color': SERVER_COLORS.get(shortname, SERVER_COLORS["default"]),
-                'lines': [],  # Store lines of output
+                'lines': collections.deque(maxlen=MAX_SERVER_LINES),  # Last lines of output
+                'msg_width': win_width - 11,  # Room left after the timestamp and border
                 'start_time': None,
                 'end_time': None,
                 'response_time': None,
                 'tokens': None,
-                'response_ok': False
+                'response_ok': False,
+                '_dirty': True  # Set by mutators; update_server_window skips clean windows
             }
             
+            # Carry results over a refresh/resize, re-fitting messages to the new width
+            if old_info is not None:
+                info = self.server_windows[shortname]
+                for key in ('status', 'start_time', 'end_time', 'response_time', 'tokens', 'response_ok'):
+                    info[key] = old_info[key]
+                for line in old_info['lines']:
+                    line['display'] = _fit_message(line['message'], info['msg_width'])
+                    info['lines'].append(line)
+            
             # Draw initial window
             self.update_server_window(shortname)
             
@@ -166,15 +425,48 @@ class CursesUI:
         self.update_header()
         self.update_footer("Ready to start tests...")
         
-        # Refresh the screen
-        self.stdscr.refresh()
+        # Push all pending window updates to the terminal at once
+        self.flush()
+        
+    def _place_window(self, win, height, width, y, x):
+        """Resize and move an existing window into place, creating it on first use"""
+        if win is not None:
+            try:
+                win.resize(height, width)
+                win.mvwin(y, x)
+                win.erase()
+                return win
+            except curses.error:
+                pass  # Doesn't fit the new screen where it is; start a fresh one
+        win = curses.newwin(height, width, y, x)
+        self._tune_window(win)
+        return win
+        
+    @staticmethod
+    def _tune_window(win):
+        """Skip cursor syncing and insert/delete optimisations that only cost escapes on small windows"""
+        win.leaveok(True)
+        win.idlok(False)
+        win.idcok(False)
+        
+    def flush(self):
+        """Write every window staged with noutrefresh() to the terminal in one pass"""
+        curses.doupdate()
         
+    def _sync_size(self):
+        """Re-lay out the windows if ncurses has applied a resize we have not seen yet"""
+        # ncurses resizes stdscr during doupdate()/get_wch(), which can be well
+        # before _input_loop reads KEY_RESIZE; drawing with the old size overruns
+        if self._servers is not None and self.stdscr.getmaxyx() != (self.max_y, self.max_x):
+            self.handle_resize(self._servers)
+            
     def update_header(self, iteration=0):
         """Update the header with test information"""
+        self._sync_size()
         if not self.header_win:
             return
             
-        self.header_win.clear()
+        self.header_win.erase()
         self.header_win.box()
         
         # Add title
@@ -185,15 +477,17 @@ class CursesUI:
         x = (self.max_x - len(title)) // 2
         self.header_win.addstr(1, x, title, curses.color_pair(CURSES_COLOR_PAIRS["header"]) | curses.A_BOLD)
         
-        # Refresh the header
-        self.header_win.refresh()
+        # Stage the header and push it out
+        self.header_win.noutrefresh()
+        self.flush()
         
     def update_footer(self, message, success=None, countdown=False):
         """Update the footer with status message, optionally as countdown"""
+        self._sync_size()
         if not self.footer_win:
             return
             
-        self.footer_win.clear()
+        self.footer_win.erase()
         self.footer_win.box()
         
         # Determine color based on message type
@@ -208,7 +502,7 @@ class CursesUI:
             )
             
         # Add message
-        timestamp = datetime.now().strftime("%H:%M:%S")
+        timestamp = _now_hms()
         footer_text = f"[{timestamp}] {message}"
         self.footer_win.addstr(1, 2, footer_text, color | curses.A_BOLD)
         
@@ -218,30 +512,30 @@ class CursesUI:
         if x > 0:
             self.footer_win.addstr(1, x, help_text)
             
-        # Refresh the footer
-        self.footer_win.refresh()
+        # Stage the footer and push it out
+        self.footer_win.noutrefresh()
+        self.flush()
         
     def add_server_message(self, shortname, message, is_error=False):
         """Add a message to a server's window"""
         if shortname not in self.server_windows:
             return
             
-        timestamp = datetime.now().strftime("%H:%M:%S")
+        timestamp = _now_hms()
         server_info = self.server_windows[shortname]
         
         # Add message to lines buffer
         server_info['lines'].append({
             'timestamp': timestamp,
             'message': message,
+            'display': _fit_message(message, server_info['msg_width']),
             'is_error': is_error
         })
-        
-        # Only keep last 20 messages
-        if len(server_info['lines']) > 20:
-            server_info['lines'] = server_info['lines'][-20:]
+        server_info['_dirty'] = True
             
         # Update the window
         self.update_server_window(shortname)
+        self.flush()
         
     def update_server_status(self, shortname, status):
         """Update a server's status"""
@@ -251,41 +545,30 @@ class CursesUI:
         server_info = self.server_windows[shortname]
         old_status = server_info['status']
         server_info['status'] = status
+        if status != old_status:
+            server_info['_dirty'] = True
         
         # Set timestamps for start and end
         if old_status == 'Waiting' and status == 'Running':
             server_info['start_time'] = datetime.now()
+            server_info['_dirty'] = True
         elif status in ['Success', 'Failed'] and server_info['start_time']:
             server_info['end_time'] = datetime.now()
+            server_info['_dirty'] = True
             
         # Update the window
         self.update_server_window(shortname)
+        self.flush()
         
-    def update_server_window(self, shortname):
-        """Redraw a server's window with current information"""
-        if shortname not in self.server_windows:
-            return
-            
-        server_info = self.server_windows[shortname]
-        win = server_info['window']
-        
-        # Clear window
-        win.clear()
+    def _server_rows(self, server_info, max_y, max_x):
+        """Build the interior rows of a server window as tuples of (x, text, attr) segments"""
+        rows = []
         
-        # Draw box and title
-        win.box()
-        # Include more info in the title: shortname, model, and server
-        title = f" {shortname} "
-        max_y, max_x = win.getmaxyx()
-        title_x = (max_x - len(title)) // 2
-        if title_x > 0:
-            win.addstr(0, title_x, title, curses.color_pair(server_info['color']) | curses.A_BOLD)
-            
         # Show host/endpoint in the top line
         server_info_text = f" {server_info['server']} | {server_info['api_base']} "
         if len(server_info_text) > max_x - 4:  # Truncate if too long
             server_info_text = server_info_text[:max_x-7] + "..."
-        win.addstr(1, 2, server_info_text, curses.A_DIM)
+        rows.append(((2, server_info_text, curses.A_DIM),))
         
         # Add status with more info (model name + status)
         status_color = curses.color_pair(CURSES_COLOR_PAIRS["normal"])
@@ -297,10 +580,12 @@ class CursesUI:
             status_color = curses.color_pair(CURSES_COLOR_PAIRS["status"])
             
         # Status line with model name
-        win.addstr(2, 2, f"Model: {server_info['model']}", curses.A_DIM)
-        win.addstr(3, 2, f"Status: {server_info['status']}", status_color | curses.A_BOLD)
+        rows.append(((2, f"Model: {server_info['model']}", curses.A_DIM),))
+        rows.append(((2, f"Status: {server_info['status']}", status_color | curses.A_BOLD),))
         
         # Add timing information in a compact format
+        timing_row = ()
+        response_row = ()
         if server_info['start_time']:
             # Timing row
             start_str = server_info['start_time'].strftime("%H:%M:%S")
@@ -310,17 +595,20 @@ class CursesUI:
                 duration = (server_info['end_time'] - server_info['start_time']).total_seconds()
                 timing_line += f" | Time: {duration:.2f}s"
                 
-            win.addstr(4, 2, timing_line)
+            timing_row = ((2, timing_line, 0),)
             
             # Response info row
             if server_info['response_ok']:
-                win.addstr(5, 2, "Response: OK", curses.color_pair(CURSES_COLOR_PAIRS["success"]))
+                response_row = ((2, "Response: OK", curses.color_pair(CURSES_COLOR_PAIRS["success"])),)
                 if server_info['tokens']:
                     token_info = f"Tokens: {server_info['tokens']}"
-                    win.addstr(5, max_x - len(token_info) - 2, token_info)
+                    response_row += ((max_x - len(token_info) - 2, token_info, 0),)
+        rows.append(timing_row)
+        rows.append(response_row)
                 
         # Display messages (starting from a lower position)
         y = 6
+        time_color = curses.color_pair(CURSES_COLOR_PAIRS["time"])
         for i, line in enumerate(reversed(server_info['lines'])):
             if y + i >= max_y - 1:  # Prevent writing outside window
                 break
@@ -330,39 +618,73 @@ class CursesUI:
                 CURSES_COLOR_PAIRS["error"] if line['is_error'] else CURSES_COLOR_PAIRS["normal"]
             )
             
-            # Add timestamp
-            time_color = curses.color_pair(CURSES_COLOR_PAIRS["time"])
-            win.addstr(y + i, 1, line['timestamp'], time_color)
+            rows.append(((1, line['timestamp'], time_color), (10, line['display'], msg_color)))
             
-            # Add message, wrapped if needed
-            max_msg_width = max_x - 11  # Allow for timestamp and padding
-            if len(line['message']) > max_msg_width:
-                msg = line['message'][:max_msg_width-3] + "..."
-            else:
-                msg = line['message']
-                
-            win.addstr(y + i, 10, msg, msg_color)
+        # Blank out rows that no longer hold a message; a short window drops
+        # the info rows that don't fit instead of drawing past its border
+        while len(rows) < max_y - 2:
+            rows.append(())
+        return rows[:max_y - 2]
+        
+    def update_server_window(self, shortname):
+        """Repaint the rows of a server's window that changed since the last draw"""
+        self._sync_size()
+        if shortname not in self.server_windows:
+            return
+            
+        server_info = self.server_windows[shortname]
+        if not server_info['_dirty']:
+            return
+        win = server_info['window']
+        max_y, max_x = win.getmaxyx()
+        
+        prev = self._prev.get(shortname)
+        if prev is None or len(prev) != max_y - 2:
+            # First draw: the box and title are static until the next setup/resize
+            win.erase()
+            win.box()
+            title = f" {shortname} "
+            title_x = (max_x - len(title)) // 2
+            if title_x > 0:
+                win.addstr(0, title_x, title, curses.color_pair(server_info['color']) | curses.A_BOLD)
+            prev = self._prev[shortname] = [None] * (max_y - 2)
+            
+        blank = " " * (max_x - 2)
+        for y, row in enumerate(self._server_rows(server_info, max_y, max_x), start=1):
+            if prev[y - 1] == row:
+                continue
+            # Overwrite the interior only, leaving the box border intact
+            win.addstr(y, 1, blank)
+            for x, text, attr in row:
+                width = max_x - 1 - x
+                if width > 0:
+                    win.addstr(y, x, text[:width], attr)
+            prev[y - 1] = row
             
-        # Refresh window
-        win.refresh()
+        # Stage the window; callers push it out with flush()
+        win.noutrefresh()
+        server_info['_dirty'] = False
         
     def handle_resize(self, servers):
         """Handle terminal resize event"""
-        # Get new dimensions
+        # ncurses has already resized stdscr for KEY_RESIZE; pick up the new
+        # dimensions without tearing the screen down with endwin()/initscr()
         self.stdscr.clear()
-        curses.endwin()
-        self.stdscr = curses.initscr()
+        curses.update_lines_cols()
+        self.max_y, self.max_x = self.stdscr.getmaxyx()
         self.setup_windows(servers)
         
     def check_input(self):
         """Check for keyboard input and handle it"""
-        # Set timeout for getch to make it non-blocking
-        self.stdscr.timeout(100)
+        # Return immediately when no key is waiting; _input_loop waits for stdin instead
+        self.stdscr.timeout(0)
         try:
-            key = self.stdscr.getch()
-            if key == ord('q'):  # Quit
+            # get_wch() returns a whole character (str) or a key code (int),
+            # so a multi-byte keypress is consumed in one call
+            key = self.stdscr.get_wch()
+            if key == 'q':  # Quit
                 return "quit"
-            elif key == ord('r'):  # Refresh
+            elif key == 'r':  # Refresh
                 return "refresh"
             elif key == curses.KEY_RESIZE:  # Window resize
                 return "resize"
@@ -370,279 +692,270 @@ class CursesUI:
             pass
         return None
 
-def is_openai_server(server):
-    """Check if a server is an OpenAI server based on the API base URL"""
-    api_base = server.get('openai_api_base', '')
-    return 'api.openai.com' in api_base
-
 def filter_servers(servers, cels_only=False):
     """Filter servers based on command-line options"""
     if cels_only:
-        return [server for server in servers if not is_openai_server(server)]
+        return [server for server in servers if not server['_is_openai']]
+    return servers
+
+def prepare_servers(servers):
+    """Precompute per-server request data and flags once so test iterations reuse them"""
+    for server in servers:
+        model_name = server.get('openai_model')
+        model_params = MODEL_PARAMS.get(model_name)
+        # Read-only: the same mapping is unpacked into every request for this server
+        server['_params_template'] = MappingProxyType({
+            "model": model_name,
+            "messages": TEST_MESSAGES,
+            **(model_params or {})
+        })
+        server['_params_message'] = f"Parameters: {model_params}" if model_params else None
+        # Bold "[shortname]" prefix for console output lines
+        server['_tag'] = f"[{BOLD}{server.get('shortname', model_name)}{RESET}]"
+        # OpenAI-hosted endpoints, skipped by --cels-only
+        server['_is_openai'] = 'api.openai.com' in server.get('openai_api_base', '')
     return servers
 
+@functools.lru_cache(maxsize=8)
+def _parse_yaml(path, mtime):
+    """Parse a YAML file; mtime is part of the cache key so edits are picked up"""
+    with open(path, 'r') as f:
+        return yaml.load(f, Loader=_SafeLoader)
+
 def load_server_config(config_file="model_servers.yaml"):
     """Load server configurations from YAML file"""
     try:
-        with open(config_file, 'r') as f:
-            config = yaml.safe_load(f)
-        return config.get('servers', [])
+        config = _parse_yaml(config_file, os.path.getmtime(config_file))
+        # Copy the entries: prepare_servers annotates them, the cached parse stays pristine
+        servers = [dict(server) for server in config.get('servers', [])]
+        register_rpm_limits(servers)
+        return prepare_servers(servers)
     except Exception as e:
         print(f"Error loading configuration from {config_file}: {str(e)}")
         return []
 
-async def test_openai_endpoint_curses(ui, model_name, api_base, api_key, shortname):
-    """Test a model endpoint and update the curses UI"""
-    # Update status to running
-    ui.update_server_status(shortname, "Running")
-    ui.add_server_message(shortname, "Starting test...")
+class Reporter:
+    """Receives progress and results from run_endpoint; subclasses render them for one UI"""
+    verbose = False
     
-    try:
-        # Get API key from parameter or environment
-        if not api_key:
-            api_key = os.environ.get('OPENAI_API_KEY')
-            if not api_key:
-                ui.add_server_message(shortname, "Error: OPENAI_API_KEY environment variable not set", is_error=True)
-                ui.update_server_status(shortname, "Failed")
-                return False
-            
-        # Handle variable substitution in API key
-        if api_key.startswith("${") and api_key.endswith("}"):
-            env_var = api_key[2:-1]  # Remove ${ and }
-            api_key = os.environ.get(env_var)
-            if not api_key:
-                ui.add_server_message(shortname, f"Error: Environment variable {env_var} not set", is_error=True)
-                ui.update_server_status(shortname, "Failed")
-                return False
-
-        # Create client with proper configuration
-        ui.add_server_message(shortname, "Creating OpenAI client...")
-        client = openai.OpenAI(
-            api_key=api_key,
-            base_url=api_base
-        )
-
-        # Send a simple test request with model-specific parameters
-        params = {
-            "model": model_name,
-            "messages": [
-                {"role": "user", "content": "What is 2+2? Please provide a short, direct answer."}
-            ]
-        }
+    def progress(self, text):
+        """Step-by-step chatter (client creation, request sent, ...), shown only with --verbose"""
+        if self.verbose:
+            self.message(text)
         
-        # Add model-specific parameters from the dictionary
-        # Add model-specific parameters from the dictionary
-        if model_name in MODEL_PARAMS:
-            params.update(MODEL_PARAMS[model_name])
-            ui.add_server_message(shortname, f"Parameters: {MODEL_PARAMS[model_name]}")
+    def message(self, text, is_error=False):
+        raise NotImplementedError
         
-        # Make the API call
-        start_time = datetime.now()
-        ui.add_server_message(shortname, "Sending request...")
-        try:
-            # Use async/await to allow other tests to run concurrently
-            response = await asyncio.to_thread(client.chat.completions.create, **params)
-            end_time = datetime.now()
-            response_time = (end_time - start_time).total_seconds()
-        except AuthenticationError:
-            ui.add_server_message(shortname, "Authentication error: Invalid API key", is_error=True)
-            ui.update_server_status(shortname, "Failed")
-            return False
+    def status(self, status):
+        """Server state transition: Running, Success or Failed"""
+        
+    def record(self, response_time, content, usage):
+        """Result of a completed request"""
+        
+    def fail(self, text):
+        self.message(text, is_error=True)
+        self.status("Failed")
 
-        # Check if we got a valid response
-        if response and response.choices and len(response.choices) > 0:
-            content = response.choices[0].message.content
-            ui.add_server_message(shortname, f"Response received in {response_time:.2f}s")
-            
-            # Update server window with timing and token info
-            server_info = ui.server_windows.get(shortname)
-            if server_info:
-                server_info['response_time'] = response_time
-                if hasattr(response, 'usage'):
-                    server_info['tokens'] = response.usage.total_tokens
-                server_info['response_ok'] = bool(content)
-                
-            # Only log minimal response info, not the actual content
-            if not content:
-                ui.add_server_message(shortname, "Response: EMPTY (model connected but returned no content)", is_error=True)
-            else:
-                ui.add_server_message(shortname, "Response: OK (content received)")
-                
-            # Log token usage if available
-            if hasattr(response, 'usage'):
-                tokens_info = f"Tokens: {response.usage.total_tokens} (prompt={response.usage.prompt_tokens}, completion={response.usage.completion_tokens})"
-                ui.add_server_message(shortname, tokens_info)
-                
-            ui.update_server_status(shortname, "Success")
-            return True
+class CursesReporter(Reporter):
+    """Reports into a server's window in the curses UI"""
+    def __init__(self, ui, shortname, verbose=False):
+        self.ui = ui
+        self.shortname = shortname
+        self.verbose = verbose
+        
+    def message(self, text, is_error=False):
+        self.ui.add_server_message(self.shortname, text, is_error=is_error)
+        
+    def status(self, status):
+        self.ui.update_server_status(self.shortname, status)
+        
+    def record(self, response_time, content, usage):
+        # Update server window with timing and token info
+        server_info = self.ui.server_windows.get(self.shortname)
+        if server_info:
+            server_info['response_time'] = response_time
+            if usage is not None:
+                server_info['tokens'] = usage.total_tokens
+            server_info['response_ok'] = bool(content)
+            server_info['_dirty'] = True
+            
+        # Only log minimal response info, not the actual content
+        if not content:
+            self.message("Response: EMPTY (model connected but returned no content)", is_error=True)
         else:
-            ui.add_server_message(shortname, "Error: No valid response received", is_error=True)
-            ui.update_server_status(shortname, "Failed")
-            return False
+            self.message("Response: OK (content received)")
             
-    except RateLimitError as e:
-        ui.add_server_message(shortname, f"Rate limit exceeded: {str(e)}", is_error=True)
-        ui.update_server_status(shortname, "Failed")
-        return False
-    except APIConnectionError as e:
-        ui.add_server_message(shortname, f"Connection error: {str(e)}", is_error=True)
-        ui.update_server_status(shortname, "Failed")
-        return False
-    except APITimeoutError as e:
-        ui.add_server_message(shortname, f"Timeout error: {str(e)}", is_error=True)
-        ui.update_server_status(shortname, "Failed")
-        return False
-    except APIError as e:
-        ui.add_server_message(shortname, f"OpenAI API Error: {str(e)}", is_error=True)
-        ui.update_server_status(shortname, "Failed")
-        return False
-    except Exception as e:
-        ui.add_server_message(shortname, f"Unexpected error: {str(e)}", is_error=True)
-        ui.update_server_status(shortname, "Failed")
-        return False
+        # Log token usage if available
+        if usage is not None:
+            self.message(f"Tokens: {usage.total_tokens} (prompt={usage.prompt_tokens}, completion={usage.completion_tokens})")
 
-async def test_openai_endpoint(model_name: str, api_base: str = "https://api.openai.com/v1", api_key=None, shortname=None):
-    """Test a specific OpenAI model endpoint asynchronously"""
+class ConsoleReporter(Reporter):
+    """Writes tagged lines to out (stdout by default) for console mode"""
+    def __init__(self, tag, verbose=False, out=None):
+        self.tag = tag
+        self.verbose = verbose
+        self.out = out if out is not None else sys.stdout
+        
+    def message(self, text, is_error=False):
+        self.out.write(f"{self.tag} {text}\n")
+        
+    def record(self, response_time, content, usage):
+        self.message("Success: Endpoint responded")
+        if content:
+            self.message(f"Response: {content}")
+        else:
+            self.message("Response: EMPTY (model connected but returned no content)")
+        if usage is not None:
+            self.message(f"Usage: {usage}")
+
+async def run_endpoint(reporter, server):
+    """Send one test request to a server's endpoint, reporting progress and outcome to reporter"""
+    api_base = server.get('openai_api_base')
+    api_key = server.get('openai_api_key')
+    
+    # Update status to running
+    reporter.status("Running")
+    reporter.progress("Starting test...")
+    
     try:
-        # Get API key from parameter or environment
-        if not api_key:
-            api_key = os.environ.get('OPENAI_API_KEY')
-            if not api_key:
-                print("Error: OPENAI_API_KEY environment variable not set")
-                return False
-            
-        # Handle variable substitution in API key
-        if api_key.startswith("${") and api_key.endswith("}"):
-            env_var = api_key[2:-1]  # Remove ${ and }
-            api_key = os.environ.get(env_var)
-            if not api_key:
-                print(f"Error: Environment variable {env_var} not set")
-                return False
-
-        # Create client with proper configuration
-        client = openai.OpenAI(
-            api_key=api_key,
-            base_url=api_base
-        )
+        # Reuse the endpoint's client (and its connections) across iterations
+        reporter.progress("Creating OpenAI client...")
+        try:
+            client = _get_client(api_base, api_key)
+        except ValueError as e:
+            reporter.fail(f"Error: {e}")
+            return False
 
-        # Send a simple test request with model-specific parameters
-        params = {
-            "model": model_name,
-            "messages": [
-                {"role": "user", "content": "What is 2+2? Please provide a short, direct answer."}
-            ]
-        }
-        
-        # Add model-specific parameters from the dictionary
-        if model_name in MODEL_PARAMS:
-            params.update(MODEL_PARAMS[model_name])
+        # Simple test request with model-specific parameters, built by prepare_servers
+        params = server['_params_template']
+        if server['_params_message']:
+            reporter.progress(server['_params_message'])
         
-        # Catch authentication errors before making the API call
+        # Make the API call
+        start_time = datetime.now()
+        reporter.progress("Sending request...")
         try:
-            # Use async/await to allow other tests to run concurrently
-            response = await asyncio.to_thread(client.chat.completions.create, **params)
+            # Requests run on the event loop; the host limiter bounds the fan-out
+            response = await _create_with_retry(
+                client, params, api_base,
+                on_retry=lambda delay, attempt: reporter.message(
+                    f"Rate limited, retry {attempt}/{MAX_RATE_LIMIT_RETRIES} in {delay:.1f}s..."
+                )
+            )
+            response_time = (datetime.now() - start_time).total_seconds()
         except AuthenticationError:
-            print(f"[{BOLD}{shortname or model_name}{RESET}] Authentication error: Invalid API key")
+            reporter.fail("Authentication error: Invalid API key")
             return False
 
-        # Check if we got a valid response
         # Check if we got a valid response
         if response and response.choices and len(response.choices) > 0:
             content = response.choices[0].message.content
-            print(f"[{BOLD}{shortname or model_name}{RESET}] Success: Endpoint responded")
-            if content:
-                print(f"[{BOLD}{shortname or model_name}{RESET}] Response: {content}")
-            else:
-                print(f"[{BOLD}{shortname or model_name}{RESET}] Response: EMPTY (model connected but returned no content)")
-            if hasattr(response, 'usage'):
-                print(f"[{BOLD}{shortname or model_name}{RESET}] Usage: {response.usage}")
+            reporter.progress(f"Response received in {response_time:.2f}s")
+            reporter.record(response_time, content, getattr(response, 'usage', None))
+            reporter.status("Success")
             return True
         else:
-            print(f"[{BOLD}{shortname or model_name}{RESET}] Error: No valid response received")
+            reporter.fail("Error: No valid response received")
             return False
+            
     except RateLimitError as e:
-        print(f"[{BOLD}{shortname or model_name}{RESET}] Rate limit exceeded: {str(e)}")
+        reporter.fail(f"Rate limit exceeded: {str(e)}")
         return False
     except APIConnectionError as e:
-        print(f"[{BOLD}{shortname or model_name}{RESET}] Connection error: {str(e)}")
+        reporter.fail(f"Connection error: {str(e)}")
         return False
     except APITimeoutError as e:
-        print(f"[{BOLD}{shortname or model_name}{RESET}] Timeout error: {str(e)}")
+        reporter.fail(f"Timeout error: {str(e)}")
         return False
     except APIError as e:
-        print(f"[{BOLD}{shortname or model_name}{RESET}] OpenAI API Error: {str(e)}")
+        reporter.fail(f"OpenAI API Error: {str(e)}")
         return False
     except Exception as e:
-        print(f"[{BOLD}{shortname or model_name}{RESET}] Unexpected error: {str(e)}")
+        reporter.fail(f"Unexpected error: {str(e)}")
         return False
+
+# Command line interface, built once and shared by both entry points
+_PARSER = argparse.ArgumentParser(description="Test OpenAI-compatible model server endpoints")
+_PARSER.add_argument(
+    "--delay", 
+    type=int, 
+    default=0, 
+    help="Delay in seconds between test runs (0 for single run)"
+)
+_PARSER.add_argument(
+    "--console",
+    action="store_true",
+    help="Run in console mode instead of curses UI"
+)
+_PARSER.add_argument(
+    "--cels-only",
+    action="store_true",
+    help="Test only non-OpenAI endpoints (e.g., CELS servers)"
+)
+_PARSER.add_argument(
+    "--config",
+    type=str,
+    default="model_servers.yaml",
+    help="Path to model_servers.yaml file (default: model_servers.yaml)"
+)
+_PARSER.add_argument(
+    "--max-concurrency-per-host",
+    type=int,
+    default=DEFAULT_MAX_CONCURRENCY_PER_HOST,
+    help=f"Maximum simultaneous requests to one API host (default: {DEFAULT_MAX_CONCURRENCY_PER_HOST})"
+)
+_PARSER.add_argument(
+    "--verbose",
+    action="store_true",
+    help="Show every step of each test, not just results and errors"
+)
+
 def parse_arguments():
     """Parse command line arguments"""
-    parser = argparse.ArgumentParser(description="Test OpenAI-compatible model server endpoints")
-    parser.add_argument(
-        "--delay", 
-        type=int, 
-        default=0, 
-        help="Delay in seconds between test runs (0 for single run)"
-    )
-    parser.add_argument(
-        "--console",
-        action="store_true",
-        help="Run in console mode instead of curses UI"
-    )
-    parser.add_argument(
-        "--cels-only",
-        action="store_true",
-        help="Test only non-OpenAI endpoints (e.g., CELS servers)"
-    )
-    parser.add_argument(
-        "--config",
-        type=str,
-        default="model_servers.yaml",
-        help="Path to model_servers.yaml file (default: model_servers.yaml)"
-    )
-    return parser.parse_args()
+    return _PARSER.parse_args()
 
-async def test_server_curses(ui, server):
+async def test_server_curses(ui, server, verbose=False):
     """Run a test for a single server using the curses UI"""
-    model_name = server.get('openai_model')
-    api_base = server.get('openai_api_base')
-    api_key = server.get('openai_api_key')
-    shortname = server.get('shortname', model_name)
+    shortname = server.get('shortname', server.get('openai_model'))
+    reporter = CursesReporter(ui, shortname, verbose)
     
     # Update UI with server info
-    ui.add_server_message(shortname, f"API Base: {api_base}")
+    reporter.progress(f"API Base: {server.get('openai_api_base')}")
     
     # Run the test
-    success = await test_openai_endpoint_curses(ui, model_name, api_base, api_key, shortname)
-    
-    return success
+    return await run_endpoint(reporter, server)
 
-async def test_server(server):
+async def test_server(server, verbose=False):
     """Run a test for a single server"""
     model_name = server.get('openai_model')
     api_base = server.get('openai_api_base')
-    api_key = server.get('openai_api_key')
     shortname = server.get('shortname', model_name)
+    tag = server['_tag']
+    
+    # Collect the whole server block and write it in one go, so concurrent
+    # tests don't interleave their lines and each block costs a single flush
+    buf = io.StringIO()
     
     # Create a distinctive header for this server test
-    server_header = f"\n{'=' * 60}\n{BOLD}{CYAN}SERVER: {shortname} ({model_name}){RESET}\n{'-' * 60}"
-    print(server_header)
-    print(f"[{BOLD}{shortname}{RESET}] API Base: {api_base}")
+    buf.write(f"\n{'=' * 60}\n{BOLD}{CYAN}SERVER: {shortname} ({model_name}){RESET}\n{'-' * 60}\n")
+    buf.write(f"{tag} API Base: {api_base}\n")
     
     # Run the test for this server
-    success = await test_openai_endpoint(model_name, api_base, api_key, shortname)
+    success = await run_endpoint(ConsoleReporter(tag, verbose, buf), server)
     
     # Display status with color
     status_color = GREEN if success else RED
     status_text = "SUCCESS" if success else "FAILURE"
-    print(f"[{BOLD}{shortname}{RESET}] Status: {status_color}{status_text}{RESET}")
+    buf.write(f"{tag} Status: {status_color}{status_text}{RESET}\n")
     
     # Close the server output section
-    print(f"{'-' * 60}")
+    buf.write(f"{'-' * 60}\n")
     
+    sys.stdout.write(buf.getvalue())
+    sys.stdout.flush()
     return success
 
-async def run_tests_curses(ui, servers, iteration=0):
+async def run_tests_curses(ui, servers, iteration=0, verbose=False):
     """Run tests on all configured servers in parallel with curses UI"""
     # Update header with iteration
     ui.update_header(iteration)
@@ -650,7 +963,7 @@ async def run_tests_curses(ui, servers, iteration=0):
     
     # Run all tests concurrently
     results = await asyncio.gather(
-        *[test_server_curses(ui, server) for server in servers],
+        *[test_server_curses(ui, server, verbose) for server in servers],
         return_exceptions=False
     )
     
@@ -665,15 +978,18 @@ async def run_tests_curses(ui, servers, iteration=0):
         
     return all_success
 
-async def run_tests(servers):
+async def run_tests(servers, verbose=False):
     """Run tests on all configured servers in parallel"""
-    print(f"\n{YELLOW}TESTING ALL MODEL SERVER ENDPOINTS{RESET}")
-    print(f"{YELLOW}Started at: {datetime.now()}{RESET}")
-    print(f"{YELLOW}{'=' * 60}{RESET}")
+    sys.stdout.write(
+        f"\n{YELLOW}TESTING ALL MODEL SERVER ENDPOINTS{RESET}\n"
+        f"{YELLOW}Started at: {datetime.now()}{RESET}\n"
+        f"{YELLOW}{'=' * 60}{RESET}\n"
+    )
+    sys.stdout.flush()
 
     # Run all tests concurrently
     results = await asyncio.gather(
-        *[test_server(server) for server in servers],
+        *[test_server(server, verbose) for server in servers],
         return_exceptions=False
     )
     
@@ -681,10 +997,53 @@ async def run_tests(servers):
     all_success = all(results)
     
     return all_success
-async def main_curses(stdscr):
+
+# Longest wait for stdin before checking for a KEY_RESIZE anyway; ncurses
+# queues resizes from its SIGWINCH handler, which doesn't wake stdin
+RESIZE_POLL_INTERVAL = 1.0
+
+# Seconds between keyboard polls when stdin can't be watched for readiness
+INPUT_POLL_INTERVAL = 0.05
+
+async def _input_loop(ui, servers, flags):
+    """Service keyboard input alongside the tests until quit is requested"""
+    # Sleep until stdin is readable instead of polling getch()
+    loop = asyncio.get_running_loop()
+    ready = asyncio.Event()
+    fd = sys.stdin.fileno()
+    try:
+        loop.add_reader(fd, ready.set)
+    except (OSError, NotImplementedError):
+        # e.g. stdin redirected from /dev/null, which epoll refuses; poll instead
+        fd = None
+    try:
+        while not flags['stop']:
+            cmd = ui.check_input()
+            if cmd == "quit":
+                flags['stop'] = True
+            elif cmd == "refresh":
+                ui.setup_windows(servers)
+                flags['redraw'] = True
+            elif cmd == "resize":
+                ui.handle_resize(servers)
+                flags['redraw'] = True
+            elif cmd is None:
+                if fd is None:
+                    await asyncio.sleep(INPUT_POLL_INTERVAL)
+                    continue
+                # Input drained; wait for more
+                ready.clear()
+                try:
+                    await asyncio.wait_for(ready.wait(), RESIZE_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+    finally:
+        if fd is not None:
+            loop.remove_reader(fd)
+
+async def main_curses(stdscr, args):
     """Main function for curses mode"""
-    # Parse command line arguments
-    args = parse_arguments()
+    set_max_concurrency_per_host(args.max_concurrency_per_host)
     
     # Load server configurations from YAML
     servers = load_server_config(args.config)
@@ -701,7 +1060,7 @@ async def main_curses(stdscr):
         ]
         
         # Filter default servers if cels-only mode is enabled
-        servers = filter_servers(default_servers, args.cels_only)
+        servers = filter_servers(prepare_servers(default_servers), args.cels_only)
         
         # If still no servers after filtering, warn user
         if not servers and args.cels_only:
@@ -717,77 +1076,105 @@ async def main_curses(stdscr):
     ui = CursesUI(stdscr)
     ui.setup_windows(servers)
     
+    # Keyboard input is handled by a background task so 'q', 'r' and resizes
+    # take effect while requests are still in flight
+    flags = {'stop': False, 'redraw': False}
+    input_task = asyncio.create_task(_input_loop(ui, servers, flags))
+    
     # Main testing loop
     iteration = 1
-    running = True
-    test_completed = False
-    
-    while running:
-        # Check for user input
-        cmd = ui.check_input()
-        if cmd == "quit":
-            running = False
-        elif cmd == "refresh":
-            ui.setup_windows(servers)
-        elif cmd == "resize":
-            ui.handle_resize(servers)
-        
-        # Run tests if not already running
-        if not test_completed:
-            # Run tests once
-            await run_tests_curses(ui, servers, iteration)
-            test_completed = True
-            
-            # If we're doing multiple runs with a delay
-            # If we're doing multiple runs with a delay
-            if args.delay > 0:
-                # Display initial waiting message
-                ui.update_footer(f"Waiting {args.delay} seconds before next test run...", countdown=True)
+    try:
+        while not flags['stop']:
+            # Run tests, abandoning them if the user quits part way through
+            tests = asyncio.create_task(run_tests_curses(ui, servers, iteration, args.verbose))
+            await asyncio.wait({tests, input_task}, return_when=asyncio.FIRST_COMPLETED)
+            if not tests.done():
+                tests.cancel()
+                try:
+                    await tests
+                except asyncio.CancelledError:
+                    pass
+                # The input task only returns once quit is requested; re-raise
+                # anything else (e.g. a curses.error from a resize) instead
+                input_task.result()
+                break
+            await tests  # re-raise anything the run itself did not handle
                 
-                # Wait for the delay, but check for user input during this time
-                wait_start = time.time()
-                while time.time() - wait_start < args.delay:
-                    # Calculate remaining time and update footer with countdown
-                    elapsed = time.time() - wait_start
-                    remaining = args.delay - elapsed
-                    
-                    # Create a more visual countdown message with progress indicator
-                    percent_done = int((elapsed / args.delay) * 100)
-                    progress_width = 20  # Width of progress bar
-                    chars_filled = int(progress_width * percent_done / 100)
+            # Without a delay there is a single run; wait for the user to quit
+            if args.delay <= 0:
+                await input_task
+                break
+                
+            # Display initial waiting message
+            ui.update_footer(f"Waiting {args.delay} seconds before next test run...", countdown=True)
+            
+            # Count down to the next run; input keeps being handled by input_task
+            progress_width = 20  # Width of progress bar
+            delay = args.delay
+            now = time.monotonic
+            deadline = now() + delay
+            last_sec = -1
+            last_chars = -1
+            while not flags['stop']:
+                # Calculate remaining time and update footer with countdown
+                remaining = deadline - now()
+                if remaining <= 0:
+                    break
+                elapsed = delay - remaining
+                sec = int(remaining)
+                percent_done = int((elapsed / delay) * 100)
+                chars_filled = int(progress_width * percent_done / 100)
+                
+                # A refresh or resize redrew the footer from scratch
+                if flags['redraw']:
+                    flags['redraw'] = False
+                    last_sec = -1
                     
+                # Only repaint the footer when the visible countdown changes
+                if sec != last_sec or chars_filled != last_chars:
                     # Build progress bar
                     progress_bar = "[" + "=" * chars_filled + " " * (progress_width - chars_filled) + "]"
                     
                     # Update countdown with progress
-                    message = f"NEXT TEST: {int(remaining)}s remaining {progress_bar} {percent_done}%"
+                    message = f"NEXT TEST: {sec}s remaining {progress_bar} {percent_done}%"
                     ui.update_footer(message, countdown=True)
+                    last_sec, last_chars = sec, chars_filled
                     
-                    # Check for user input
-                    cmd = ui.check_input()
-                    if cmd == "quit":
-                        running = False
-                        break
-                    elif cmd == "refresh":
-                        ui.setup_windows(servers)
-                    elif cmd == "resize":
-                        ui.handle_resize(servers)
-                    
-                    # Brief sleep to prevent CPU hogging but update display frequently
-                    await asyncio.sleep(0.1)
+                # Sleep until the seconds or the bar next change, waking early on quit
+                next_change = min(remaining - sec, (chars_filled + 1) * delay / progress_width - elapsed)
+                await asyncio.wait({input_task}, timeout=max(next_change, 0.01))
+                if input_task.done():
+                    input_task.result()  # re-raise a failure; a quit ends the loop via flags
                 
-                # If still running, increment iteration and reset test_completed
-                if running and args.delay > 0:
-                    iteration += 1
-                    test_completed = False
+            iteration += 1
+    finally:
+        flags['stop'] = True
+        input_task.cancel()
+        # Let the task unwind so it unregisters its stdin reader; only the
+        # cancellation is expected, any other failure propagates
+        try:
+            await input_task
+        except asyncio.CancelledError:
+            pass
+        
     # Final message before exiting
     ui.update_footer("Exiting test runner...", success=None)
-    time.sleep(0.5)  # Brief pause to show the message
+    await asyncio.sleep(0.5)  # Brief pause to show the message, without blocking the loop
+
+# Console iteration header and summary block
+_ITER_FMT = f"\n{BOLD}Test Iteration #{{}}{RESET}"
+_SUMMARY_BORDER = f"\n{BOLD}{'=' * 80}{RESET}"
+_PASS_LINE = f"{BOLD}SUMMARY: {GREEN}All tests passed{RESET}"
+_FAIL_LINE = f"{BOLD}SUMMARY: {RED}Some tests failed{RESET}"
+_CTRL_C_LINE = f"{BOLD}Press Ctrl+C to exit{RESET}"
 
-async def main_async():
+# Console countdown line: the 21 possible progress bars, rendered once
+_BARS = ["=" * i + ">" + " " * (20 - i) for i in range(21)]
+_BAR_FMT = f"\r{BOLD}{CYAN}[{{}}] {{}} seconds remaining... ({{}}%){RESET}"
+
+async def main_async(args):
     """Original async entry point for console mode"""
-    # Parse command line arguments
-    args = parse_arguments()
+    set_max_concurrency_per_host(args.max_concurrency_per_host)
     
     # Load server configurations from YAML
     servers = load_server_config(args.config)
@@ -805,138 +1192,90 @@ async def main_async():
         ]
         
         # Filter default servers if cels-only mode is enabled
-        servers = filter_servers(default_servers, args.cels_only)
+        servers = filter_servers(prepare_servers(default_servers), args.cels_only)
         
         # If still no servers after filtering, warn user
         if not servers and args.cels_only:
             print("Warning: No non-OpenAI servers found and --cels-only specified.")
             print("No servers to test. Exiting.")
             return
-        # Run once if delay is 0, otherwise loop with delay
-        if args.delay <= 0:
-            await run_tests(servers)
-        else:
-            iteration = 1
-            while True:
-                print(f"\n{BOLD}Test Iteration #{iteration}{RESET}")
-                all_success = await run_tests(servers)
-                summary_border = f"\n{BOLD}{'=' * 80}{RESET}"
-                print(summary_border)
-                print(f"{BOLD}SUMMARY: {GREEN}All tests passed{RESET}" if all_success 
-                      else f"{BOLD}SUMMARY: {RED}Some tests failed{RESET}")
-                print(f"{BOLD}Waiting {args.delay} seconds before next test run...{RESET}")
-                print(f"{BOLD}Press Ctrl+C to exit{RESET}")
-                print(summary_border)
-                
-                # Wait with countdown
-                wait_start = time.time()
-                while time.time() - wait_start < args.delay:
-                    # Sleep for a short time
-                    # Sleep for a short time
-                    await asyncio.sleep(1.0)
-                    # Calculate and display remaining time
-                    elapsed = time.time() - wait_start
-                    remaining = args.delay - elapsed
-                    
-                    # Show countdown more frequently in a visually appealing way
-                    if int(remaining) % 5 == 0 or remaining < 10:  # Show every 5 seconds or final countdown
-                        percent_done = int((elapsed / args.delay) * 100)
-                        # Build simple progress bar
-                        progress = "=" * (percent_done // 5) + ">" + " " * (20 - (percent_done // 5))
-                        print(f"\r{BOLD}{CYAN}[{progress}] {int(remaining)} seconds remaining... ({percent_done}%){RESET}", end="")
-                        sys.stdout.flush()
-                
-                # Move to next line after countdown
-                print()
+
     try:
         # Run once if delay is 0, otherwise loop with delay
         if args.delay <= 0:
-            await run_tests(servers)
+            await run_tests(servers, args.verbose)
         else:
             iteration = 1
             while True:
-                print(f"\n{BOLD}Test Iteration #{iteration}{RESET}")
-                all_success = await run_tests(servers)
-                summary_border = f"\n{BOLD}{'=' * 80}{RESET}"
-                print(summary_border)
-                print(f"{BOLD}SUMMARY: {GREEN}All tests passed{RESET}" if all_success 
-                      else f"{BOLD}SUMMARY: {RED}Some tests failed{RESET}")
+                print(_ITER_FMT.format(iteration))
+                all_success = await run_tests(servers, args.verbose)
+                print(_SUMMARY_BORDER)
+                print(_PASS_LINE if all_success else _FAIL_LINE)
                 print(f"{BOLD}Waiting {args.delay} seconds before next test run...{RESET}")
-                print(f"{BOLD}Press Ctrl+C to exit{RESET}")
-                print(summary_border)
+                print(_CTRL_C_LINE)
+                print(_SUMMARY_BORDER)
                 
-                # Wait with countdown
-                wait_start = time.time()
-                while time.time() - wait_start < args.delay:
-                    # Sleep for a short time
-                    await asyncio.sleep(1.0)
-                    # Calculate and display remaining time
-                    elapsed = time.time() - wait_start
-                    remaining = args.delay - elapsed
+                if not _INTERACTIVE:
+                    # Piped or redirected: no \r progress line, just one sleep
+                    await asyncio.sleep(args.delay)
+                else:
+                    # Wait with countdown, waking only when the progress line is due:
+                    # every 5 seconds, then every second for the final 10
+                    delay = args.delay
+                    now = time.monotonic  # interval clock, immune to wall-clock jumps
+                    write, flush = sys.stdout.write, sys.stdout.flush
+                    end = now() + delay
+                    # Whole seconds remaining at each update: multiples of 5 down
+                    # to 10, then every second
+                    marks = (*range(5 * ((delay - 1) // 5), 10, -5), *range(min(delay - 1, 10), -1, -1))
+                    for mark in marks:
+                        # Each wake is an absolute point measured from the start, so
+                        # late wakeups don't accumulate over long delays
+                        await asyncio.sleep(max(0, end - mark - now()))
                     
-                    # Show countdown more frequently in a visually appealing way
-                    if int(remaining) % 5 == 0 or remaining < 10:  # Show every 5 seconds or final countdown
-                        percent_done = int((elapsed / args.delay) * 100)
-                        # Build simple progress bar
-                        progress = "=" * (percent_done // 5) + ">" + " " * (20 - (percent_done // 5))
-                        print(f"\r{BOLD}{CYAN}[{progress}] {int(remaining)} seconds remaining... ({percent_done}%){RESET}", end="")
-                        sys.stdout.flush()
+                        # Display remaining time from the integer mark, not the clock
+                        percent_done = (delay - mark) * 100 // delay
+                        write(_BAR_FMT.format(_BARS[percent_done // 5], mark, percent_done))
+                        flush()
                 
-                # Move to next line after countdown
-                print()
+                    # Move to next line after countdown
+                    print()
                 iteration += 1
     except KeyboardInterrupt:
         print("\nTest loop interrupted by user. Exiting...")
 
-def run_curses_app(stdscr):
+def _run(main):
+    """asyncio.run(main), on a uvloop event loop when uvloop is installed"""
+    if uvloop is None:
+        return asyncio.run(main)
+    if sys.version_info >= (3, 11):
+        with asyncio.Runner(loop_factory=uvloop.new_event_loop) as runner:
+            return runner.run(main)
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    return asyncio.run(main)
+
+def run_curses_app(stdscr, args):
     """Synchronous wrapper function for the async curses application"""
-    # Run the async function in the current event loop
     try:
-        # Create a new event loop for the curses app
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        
-        # Run the async main function
-        return loop.run_until_complete(main_curses(stdscr))
-    except Exception as e:
-        # Ensure we restore the terminal properly
-        curses.endwin()
-        raise e
+        # _run owns the loop: it cancels leftover tasks, shuts down
+        # async generators and the default executor, then closes the loop
+        return _run(main_curses(stdscr, args))
+    finally:
+        # Restore the terminal however we leave, including Ctrl+C and SystemExit
+        if not curses.isendwin():
+            curses.endwin()
 
 def main():
     """Main entry point that decides between curses and console mode"""
-    # Parse arguments to check if curses should be used
-    parser = argparse.ArgumentParser(description="Test OpenAI-compatible model server endpoints")
-    parser.add_argument(
-        "--delay", 
-        type=int, 
-        default=0, 
-        help="Delay in seconds between test runs (0 for single run)"
-    )
-    parser.add_argument(
-        "--console",
-        action="store_true",
-        help="Run in console mode instead of curses UI"
-    )
-    parser.add_argument(
-        "--cels-only",
-        action="store_true",
-        help="Test only non-OpenAI endpoints (e.g., CELS servers)"
-    )
-    parser.add_argument(
-        "--config",
-        type=str,
-        default="model_servers.yaml",
-        help="Path to model_servers.yaml file (default: model_servers.yaml)"
-    )
-    args = parser.parse_args()
+    # Parse arguments once; both modes receive the same namespace
+    args = parse_arguments()
     try:
         if args.console:
             # Run in console mode
-            asyncio.run(main_async())
+            _run(main_async(args))
         else:
             # Run in curses mode using wrapper for proper initialization/cleanup
-            curses.wrapper(run_curses_app)
+            curses.wrapper(run_curses_app, args)
     except KeyboardInterrupt:
         print(f"\n{BOLD}{YELLOW}Test loop interrupted by user. Exiting...{RESET}")
     except curses.error as e:
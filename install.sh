@@ -106,7 +106,7 @@ install_with_pip() {
     
     # Install dependencies
     print_status "Installing required packages..."
-    $PYTHON_CMD -m pip install openai rich pylatexenc regex pyyaml
+    $PYTHON_CMD -m pip install openai rich pylatexenc pyyaml
     
     print_success "All dependencies installed successfully with pip!"
 }
@@ -121,7 +121,7 @@ install_with_conda() {
     
     # Install remaining packages with pip (these are typically not available in conda)
     print_status "Installing remaining packages with pip..."
-    pip install pylatexenc regex
+    pip install pylatexenc
     
     print_success "All dependencies installed successfully with conda!"
 }
@@ -135,7 +135,6 @@ verify_installation() {
 import openai
 import rich
 import pylatexenc
-import regex
 import yaml
 print('All packages imported successfully!')
 " 2>/dev/null; then